@@ -5,32 +5,59 @@
 #
 
 import argparse
+import asyncio
+import codecs
+import collections
 import concurrent.futures
-import fnmatch
 import jinja2
 import json
 import logging
 import os
 import random
 import re
-import subprocess
+import requests
 import sys
-import threading
-import time
+import urllib3
 import yaml
 
 from pathlib import Path
-from queue import Queue, Empty
-from urllib.request import urlopen, URLError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
 
 LOGGER = logging.getLogger("testflinger-submitter")
 
 # Configuration Constants
 AGENT_DATA_URL = "CHANGEME"
+# Testflinger server for direct REST API calls, testflinger-cli is used if unset
+TESTFLINGER_SERVER = os.environ.get("TESTFLINGER_SERVER", "")
 OUTPUT_DIR = "output"
 DEFAULT_AGENT_LIMIT = 15
 DEFAULT_COMPLETION_THRESHOLD = 11
 TIMEOUT_SECONDS = 3600  # 1 hour timeout for operations
+MAX_PARALLEL_CALLS = 32  # Upper bound on concurrent testflinger calls
+API_TIMEOUT_SECONDS = 30  # Timeout for a single REST API request
+POLL_INTERVAL_MIN = 1  # Initial delay between API output polls, doubled when idle
+POLL_INTERVAL_MAX = 15  # Upper bound on the delay between API output polls
+POLL_MAX_FAILURES = 10  # Consecutive failed API polls before giving up on a job
+OUTPUT_BUFFER_SIZE = 64 * 1024  # Write buffer for captured job output files
+OUTPUT_READ_SIZE = 64 * 1024  # Chunk size when reading testflinger-cli poll output
+
+JOB_ID_RE = re.compile(r"job_id:\s*(\S+)")
 
 
 def get_log_formatter():
@@ -73,22 +100,6 @@ class JobAlreadyCancelledError(TestflingerError):
     pass
 
 
-class CancellableThread:
-    """A thread that can be signalled to cancel its operation."""
-
-    def __init__(self):
-        """Initialize a new cancellable thread with a cancellation event."""
-        self.should_cancel = threading.Event()
-
-    def cancel(self):
-        """Signal the thread to cancel."""
-        self.should_cancel.set()
-
-    def is_cancelled(self):
-        """Check if the thread has been signalled to cancel."""
-        return self.should_cancel.is_set()
-
-
 class TestflingerSubmitter:
     """Main class to handle testflinger job submission and monitoring."""
 
@@ -110,20 +121,37 @@ class TestflingerSubmitter:
         self.agent_limit = agent_limit
         self.completion_threshold = completion_threshold
         self.job_ids = []
-        self.result_queue = Queue()
 
         # Add this new set to track cancelled jobs
         self.cancelled_jobs = set()
 
-        # Job state lock to prevent race conditions when updating job states
-        self.job_state_lock = threading.Lock()
+        # Per-job locks to prevent race conditions when updating job states
+        self.job_state_locks = collections.defaultdict(asyncio.Lock)
+
+        # Bounds the number of testflinger calls in flight at once
+        self._call_semaphore = asyncio.Semaphore(MAX_PARALLEL_CALLS)
+
+        # Pooled keep-alive session for agent data and, when a server is
+        # configured, the REST API; otherwise testflinger-cli is forked
+        self.server = TESTFLINGER_SERVER.rstrip("/")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=MAX_PARALLEL_CALLS,
+            max_retries=Retry(total=3, backoff_factor=0.1),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
 
         # Ensure output directory exists
         Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
-    def call_testflinger(self, command):
+    async def call_testflinger(self, command):
         """
-        Call the testflinger CLI with the given command.
+        Call testflinger with the given command.
+
+        Uses the REST API when a Testflinger server is configured and the
+        testflinger CLI otherwise. At most MAX_PARALLEL_CALLS calls run at
+        once.
 
         Args:
             command (list): Command arguments for testflinger-cli
@@ -135,16 +163,34 @@ class TestflingerSubmitter:
             TestflingerError: If the command fails
             JobAlreadyCancelledError: If attempting to cancel an already cancelled job
         """
-        cmd = ["testflinger-cli"]
-        cmd.extend(command)
-        LOGGER.debug("Executing: %s", " ".join(cmd))
+        async with self._call_semaphore:
+            if self.server:
+                # requests is blocking, keep it off the event loop
+                return await asyncio.to_thread(self._call_api, command)
+
+            cmd = ["testflinger-cli"]
+            cmd.extend(command)
+            LOGGER.debug("Executing: %s", " ".join(cmd))
+
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(
+                    process.communicate(), TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                LOGGER.error(
+                    "Testflinger command timed out after %s seconds", TIMEOUT_SECONDS
+                )
+                raise TestflingerError(f"Command timed out: {' '.join(cmd)}")
 
-        try:
-            return subprocess.check_output(
-                cmd, stderr=subprocess.STDOUT, timeout=TIMEOUT_SECONDS
-            ).decode()
-        except subprocess.CalledProcessError as e:
-            output = e.output.decode() if e.output else str(e)
+        output = stdout.decode()
+        if process.returncode != 0:
             LOGGER.error("Testflinger command failed: %s", output)
 
             # Check if this is a cancel command on an already cancelled job
@@ -157,34 +203,160 @@ class TestflingerSubmitter:
                     f"Job {command[1]} is already cancelled or completed"
                 )
 
-            raise TestflingerError(f"Command failed: {' '.join(cmd)}") from e
-        except subprocess.TimeoutExpired:
-            LOGGER.error(
-                "Testflinger command timed out after %s seconds", TIMEOUT_SECONDS
-            )
-            raise TestflingerError(f"Command timed out: {' '.join(cmd)}")
+            raise TestflingerError(f"Command failed: {' '.join(cmd)}")
 
-    def is_job_running(self, job_id):
+        return output
+
+    def _call_api(self, command):
         """
-        Check if a job is currently running and can be cancelled.
+        Perform a testflinger-cli style command through the REST API.
+
+        Output mimics the CLI so callers can parse it the same way.
 
         Args:
-            job_id (str): The ID of the job to check
+            command (list): Command arguments as for testflinger-cli
 
         Returns:
-            bool: True if the job is still running, False otherwise
+            str: Output equivalent to that of the command
+
+        Raises:
+            TestflingerError: If the request fails
+            JobAlreadyCancelledError: If attempting to cancel an already cancelled job
         """
+        action, target = command
+        LOGGER.debug("Requesting: %s %s", action, target)
+
         try:
-            output = self.call_testflinger(["status", job_id])
-            # If "completed" or "cancelled" appears in the status, the job is no longer running
-            if "completed" in output or "cancelled" in output:
-                return False
-            return True
-        except TestflingerError:
-            # If we can't get the status, assume it's not running
-            return False
+            if action == "submit":
+                with open(target, "r") as f:
+                    job_data = yaml.safe_load(f)
+                response = self._session.post(
+                    f"{self.server}/v1/job", json=job_data, timeout=API_TIMEOUT_SECONDS
+                )
+            elif action == "status":
+                response = self._session.get(
+                    f"{self.server}/v1/result/{target}", timeout=API_TIMEOUT_SECONDS
+                )
+            elif action == "cancel":
+                response = self._session.post(
+                    f"{self.server}/v1/job/{target}/action",
+                    json={"action": "cancel"},
+                    timeout=API_TIMEOUT_SECONDS,
+                )
+            else:
+                raise TestflingerError(f"Unsupported API command: {action}")
 
-    def safe_cancel_job(self, job_id):
+            # The server answers 400 when the job is already completed/cancelled
+            if action == "cancel" and response.status_code == 400:
+                raise JobAlreadyCancelledError(
+                    f"Job {target} is already cancelled or completed"
+                )
+            if response.status_code != 200:
+                LOGGER.error(
+                    "Testflinger API request failed with status code %s: %s",
+                    response.status_code,
+                    response.text,
+                )
+                raise TestflingerError(
+                    f"API returned status code {response.status_code} "
+                    f"for: {action} {target}"
+                )
+
+            if action == "submit":
+                return f"job_id: {response.json()['job_id']}\n"
+            if action == "status":
+                return response.json().get("job_state", "")
+            return response.text
+        except (requests.RequestException, OSError, ValueError, KeyError) as e:
+            LOGGER.error("Testflinger API request failed: %s", str(e))
+            raise TestflingerError(f"API request failed: {action} {target}") from e
+
+    async def _read_lines(self, stream):
+        """
+        Read lines from a subprocess output stream.
+
+        The stream is read in chunks rather than with readline, so a single
+        long line can't overrun the reader's line limit. Lines are split on
+        any line boundary, a bare carriage return included, as universal
+        newlines did.
+
+        Args:
+            stream (asyncio.StreamReader): Stream to read from
+
+        Yields:
+            str: Lines of output, with their line endings
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        while True:
+            chunk = await stream.read(OUTPUT_READ_SIZE)
+            pending += decoder.decode(chunk, final=not chunk)
+            lines = pending.splitlines(keepends=True)
+            pending = ""
+            # Hold back a trailing partial line until the rest of it arrives
+            if chunk and lines and lines[-1].splitlines()[0] == lines[-1]:
+                pending = lines.pop()
+            for line in lines:
+                yield line
+            if not chunk:
+                return
+
+    async def _poll_api_output(self, job_id):
+        """
+        Poll the REST API for job output until the job ends.
+
+        The delay between polls doubles while no new output arrives, up to
+        POLL_INTERVAL_MAX, and drops back once output shows up again. Polling
+        stops after POLL_MAX_FAILURES consecutive failed rounds.
+
+        Args:
+            job_id (str): The ID of the job to poll
+
+        Yields:
+            str: Lines of job output
+        """
+        interval = POLL_INTERVAL_MIN
+        failures = 0
+        while True:
+            failed = False
+            try:
+                async with self._call_semaphore:
+                    response = await asyncio.to_thread(
+                        self._session.get,
+                        f"{self.server}/v1/result/{job_id}/output",
+                        timeout=API_TIMEOUT_SECONDS,
+                    )
+            except requests.RequestException as e:
+                LOGGER.warning("Error polling output of job %s: %s", job_id, str(e))
+                response = None
+
+            if response is not None and response.status_code == 200 and response.text:
+                for line in response.text.splitlines():
+                    yield line
+                interval = POLL_INTERVAL_MIN
+            else:
+                if response is None or response.status_code not in (200, 204):
+                    failed = True
+                interval = min(POLL_INTERVAL_MAX, interval * 2)
+
+            try:
+                job_state = await self.call_testflinger(["status", job_id])
+                if job_state in ("complete", "completed", "cancelled"):
+                    return
+            except TestflingerError as e:
+                LOGGER.warning("Error polling job %s: %s", job_id, str(e))
+                failed = True
+
+            failures = failures + 1 if failed else 0
+            if failures >= POLL_MAX_FAILURES:
+                LOGGER.error(
+                    "Giving up on job %s after %d failed polls", job_id, failures
+                )
+                return
+
+            await asyncio.sleep(interval)
+
+    async def safe_cancel_job(self, job_id):
         """
         Cancel a job safely, checking if it's already been cancelled first.
 
@@ -194,21 +366,16 @@ class TestflingerSubmitter:
         Returns:
             bool: True if the job was cancelled, False if it was already cancelled
         """
-        with self.job_state_lock:
+        async with self.job_state_locks[job_id]:
             # Check if this job has already been cancelled
             if job_id in self.cancelled_jobs:
                 LOGGER.debug("Job %s already cancelled, skipping", job_id)
                 return False
 
-            # Check if the job is still running
-            if not self.is_job_running(job_id):
-                LOGGER.debug("Job %s no longer running, marking as cancelled", job_id)
-                self.cancelled_jobs.add(job_id)
-                return False
-
             try:
-                # Try to cancel the job
-                self.call_testflinger(["cancel", job_id])
+                # Try to cancel the job, a job that already finished or was
+                # cancelled is reported through JobAlreadyCancelledError
+                await self.call_testflinger(["cancel", job_id])
                 LOGGER.info("Successfully cancelled job %s", job_id)
                 self.cancelled_jobs.add(job_id)
                 return True
@@ -221,28 +388,61 @@ class TestflingerSubmitter:
                 LOGGER.warning("Error cancelling job %s: %s", job_id, str(e))
                 return False
 
-    def get_agent_data(self):
+    def get_agent_data(self, servers):
         """
-        Retrieve agent data from the Testflinger API.
+        Retrieve data of agents serving any of the given servers from the API.
+
+        With ijson installed the response is parsed as it streams in and
+        entries of other agents are dropped one at a time, instead of
+        building the whole agent list first.
+
+        Args:
+            servers (frozenset): Server names to match agent queues against
 
         Returns:
-            list: Agent data from the API
+            list: Agent data from the API for the matching agents
 
         Raises:
             TestflingerError: If API request fails
         """
+        parse_errors = (json.JSONDecodeError,)
+        if ijson:
+            parse_errors += (ijson.JSONError,)
+
         try:
-            with urlopen(AGENT_DATA_URL, timeout=30) as response:
-                if response.getcode() != 200:
+            with self._session.get(
+                AGENT_DATA_URL, timeout=API_TIMEOUT_SECONDS, stream=True
+            ) as response:
+                if response.status_code != 200:
                     LOGGER.error(
                         "Failed to retrieve agent data, status code: %s",
-                        response.getcode(),
+                        response.status_code,
                     )
                     raise TestflingerError(
-                        f"API returned status code {response.getcode()}"
+                        f"API returned status code {response.status_code}"
                     )
-                return json.loads(response.read().decode())
-        except (URLError, json.JSONDecodeError) as e:
+                if ijson:
+                    # Reading response.raw directly means dropped connections
+                    # and read timeouts raise urllib3 errors, not requests ones
+                    response.raw.decode_content = True
+                    entries = ijson.items(response.raw, "item", use_float=True)
+                # Both parsers take the raw bytes, no need to decode them first
+                elif orjson:
+                    entries = orjson.loads(response.content)
+                else:
+                    entries = json.loads(response.content)
+
+                # Keep only agents that are in any of our target servers
+                return [
+                    entry
+                    for entry in entries
+                    if not servers.isdisjoint(entry.get("queues", ()))
+                ]
+        except (
+            requests.RequestException,
+            urllib3.exceptions.HTTPError,
+            *parse_errors,
+        ) as e:
             LOGGER.error("Error retrieving agent data: %s", str(e))
             raise TestflingerError("Failed to retrieve or parse agent data") from e
 
@@ -257,7 +457,7 @@ class TestflingerSubmitter:
             list: Names of available agents sorted by suitability
         """
         try:
-            data = self.get_agent_data()
+            data = self.get_agent_data(frozenset(servers))
         except TestflingerError as e:
             LOGGER.error("Failed to get agent data: %s", str(e))
             return []
@@ -268,10 +468,6 @@ class TestflingerSubmitter:
 
         agents = []
         for entry in data:
-            # Check if this agent is in any of our target servers
-            if not any(server in entry.get("queues", []) for server in servers):
-                continue
-
             name = entry["name"]
             state = entry["state"]
 
@@ -287,18 +483,16 @@ class TestflingerSubmitter:
             LOGGER.info("%-20s %-10s %s", name, state, streak)
 
             if state == "waiting":
-                agents.append({"name": name, "streak": streak})
+                agents.append((streak, name))
 
         # Sort and shuffle to optimize agent selection
-        agents_sorted_by_streak = sorted(
-            agents, key=lambda x: x["streak"], reverse=True
-        )
-        agents_with_positive_streaks = [
-            agent for agent in agents_sorted_by_streak if agent["streak"] > 0
-        ]
-        agents_with_negative_streaks = [
-            agent for agent in agents_sorted_by_streak if agent["streak"] <= 0
-        ]
+        agents_with_positive_streaks = []
+        agents_with_negative_streaks = []
+        for agent in sorted(agents, key=lambda x: x[0], reverse=True):
+            if agent[0] > 0:
+                agents_with_positive_streaks.append(agent)
+            else:
+                agents_with_negative_streaks.append(agent)
 
         random.shuffle(agents_with_positive_streaks)
         sorted_agents = agents_with_positive_streaks + agents_with_negative_streaks
@@ -306,29 +500,43 @@ class TestflingerSubmitter:
         LOGGER.info("Sorted agents by preference:")
         LOGGER.info("%-20s %s", "Name", "Streak")
         LOGGER.info("-" * 40)
-        for agent in sorted_agents:
-            LOGGER.info("%-20s %s", agent["name"], agent["streak"])
+        for streak, name in sorted_agents:
+            LOGGER.info("%-20s %s", name, streak)
 
-        return [agent["name"] for agent in sorted_agents]
+        return [name for _, name in sorted_agents]
+
+    def _iter_yaml_files(self):
+        """
+        Iterate over testflinger YAML files in the output directory.
+
+        Yields:
+            str: Path to each YAML file
+        """
+        try:
+            entries = os.scandir(OUTPUT_DIR)
+        except FileNotFoundError:
+            return
+
+        with entries:
+            for entry in entries:
+                if (
+                    entry.is_file()
+                    and entry.name.startswith("testflinger-")
+                    and entry.name.endswith(".yaml")
+                ):
+                    yield entry.path
 
     def delete_yaml_files(self):
         """
         Delete any existing testflinger YAML files from the output directory.
         """
-        pattern = "testflinger-*.yaml"
-        files = [
-            f
-            for f in os.listdir(OUTPUT_DIR)
-            if os.path.isfile(os.path.join(OUTPUT_DIR, f))
-        ]
-        matching_files = [
-            os.path.join(OUTPUT_DIR, f) for f in files if fnmatch.fnmatch(f, pattern)
-        ]
-
-        for file in matching_files:
+        for file in self._iter_yaml_files():
             try:
-                os.remove(file)
+                os.unlink(file)
                 LOGGER.debug("Deleted: %s", file)
+            except FileNotFoundError:
+                # Already gone, nothing to do
+                pass
             except OSError as e:
                 LOGGER.warning("Error deleting %s: %s", file, str(e))
 
@@ -339,15 +547,7 @@ class TestflingerSubmitter:
         Returns:
             list: Paths to YAML files
         """
-        pattern = "testflinger-*.yaml"
-        files = [
-            f
-            for f in os.listdir(OUTPUT_DIR)
-            if os.path.isfile(os.path.join(OUTPUT_DIR, f))
-        ]
-        return [
-            os.path.join(OUTPUT_DIR, f) for f in files if fnmatch.fnmatch(f, pattern)
-        ]
+        return list(self._iter_yaml_files())
 
     def generate_yaml_files(self, agents):
         """
@@ -356,6 +556,16 @@ class TestflingerSubmitter:
         Args:
             agents (list): List of agent names
         """
+        try:
+            env = jinja2.Environment(
+                loader=jinja2.FileSystemLoader("."),
+                bytecode_cache=jinja2.FileSystemBytecodeCache(),
+            )
+            template = env.get_template("testflinger_template_noble.yaml")
+        except jinja2.exceptions.TemplateError as e:
+            LOGGER.error("Error loading template: %s", str(e))
+            return
+
         for agent in agents:
             template_vars = {
                 "job_name": f"job-{agent}",
@@ -363,22 +573,14 @@ class TestflingerSubmitter:
                 "distro_series": "noble",
             }
 
+            testflinger_filename = os.path.join(OUTPUT_DIR, f"testflinger-{agent}.yaml")
             try:
-                env = jinja2.Environment(loader=jinja2.FileSystemLoader("."))
-                template = env.get_template("testflinger_template_noble.yaml")
-
-                testflinger_filename = os.path.join(
-                    OUTPUT_DIR, f"testflinger-{agent}.yaml"
-                )
-                with open(testflinger_filename, "w") as out:
-                    out.write(template.render(**template_vars))
+                Path(testflinger_filename).write_text(template.render(**template_vars))
                 LOGGER.debug("Generated %s", testflinger_filename)
             except (jinja2.exceptions.TemplateError, OSError) as e:
                 LOGGER.error("Error generating YAML for %s: %s", agent, str(e))
 
-    def monitor_subjob(
-        self, subjob, result_queue, output_directory, cancellation_token
-    ):
+    async def monitor_subjob(self, subjob, output_directory, cancellation_event):
         """
         Monitor a single subjob and write its output to a file.
         """
@@ -389,103 +591,106 @@ class TestflingerSubmitter:
         process = None
 
         try:
-            with open(output_file, "w") as file:
-                process = subprocess.Popen(
-                    ["testflinger-cli", "poll", subjob],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                )
+            # Lines are buffered, closing the file flushes whatever is left
+            with open(output_file, "w", buffering=OUTPUT_BUFFER_SIZE) as file:
+                if self.server:
+                    lines = self._poll_api_output(subjob)
+                else:
+                    process = await asyncio.create_subprocess_exec(
+                        "testflinger-cli",
+                        "poll",
+                        subjob,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT,
+                    )
+                    lines = self._read_lines(process.stdout)
 
-                # Set up a separate thread to check for cancellation
-                def check_cancellation():
-                    while process.poll() is None:
-                        if cancellation_token.is_cancelled():
-                            LOGGER.info(
-                                "Subjob %s received cancellation signal, killing process...",
-                                subjob,
-                            )
-                            # Kill the process immediately
-                            try:
-                                process.kill()
-                            except OSError:
-                                pass
-                            # Then cancel the job - use the safe_cancel method here
-                            self.safe_cancel_job(subjob)
-                            return
-                        time.sleep(0.5)
-
-                # Start the cancellation checker in a separate thread
-                cancellation_checker = threading.Thread(target=check_cancellation)
-                cancellation_checker.daemon = True
-                cancellation_checker.start()
-
-                # Main loop to read process output
-                while process.poll() is None:
+                async def read_output():
                     try:
-                        output = process.stdout.readline().strip()
-                        if not output:
-                            continue
-
-                        if "Starting testflinger provision phase on" in output:
-                            LOGGER.debug("%s %s", subjob, output)
-                            try:
-                                ret_val["name"] = output.split(" ")[-2]
-                            except IndexError:
-                                LOGGER.warning(
-                                    "Could not parse agent name from output: %s", output
-                                )
-
-                        file.write(output + os.linesep)
-                        file.flush()
-
-                        if "You can now connect to ubuntu@" in output:
-                            try:
-                                ret_val["ip"] = output.split("@")[-1]
-                                LOGGER.info("Job %s has IP %s", subjob, ret_val["ip"])
-                                break
-                            except IndexError:
-                                LOGGER.warning(
-                                    "Could not parse IP from output: %s", output
-                                )
+                        async for line in lines:
+                            output = line.strip()
+                            if not output:
+                                continue
+
+                            if "Starting testflinger provision phase on" in output:
+                                LOGGER.debug("%s %s", subjob, output)
+                                try:
+                                    ret_val["name"] = output.split(" ")[-2]
+                                except IndexError:
+                                    LOGGER.warning(
+                                        "Could not parse agent name from output: %s",
+                                        output,
+                                    )
+
+                            file.write(output + os.linesep)
+
+                            if "You can now connect to ubuntu@" in output:
+                                file.flush()
+                                try:
+                                    ret_val["ip"] = output.split("@")[-1]
+                                    LOGGER.info(
+                                        "Job %s has IP %s", subjob, ret_val["ip"]
+                                    )
+                                    break
+                                except IndexError:
+                                    LOGGER.warning(
+                                        "Could not parse IP from output: %s", output
+                                    )
                     except (ValueError, IOError) as e:
                         LOGGER.error(
                             "Error processing output for %s: %s", subjob, str(e)
                         )
-                        break
+
+                # Race the output reader against the cancellation signal
+                read_task = asyncio.create_task(read_output())
+                cancel_task = asyncio.create_task(cancellation_event.wait())
+                done, _ = await asyncio.wait(
+                    {read_task, cancel_task}, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if cancel_task in done:
+                    LOGGER.info(
+                        "Subjob %s received cancellation signal, killing process...",
+                        subjob,
+                    )
+                    read_task.cancel()
+                    # Kill the process immediately
+                    if process:
+                        try:
+                            process.kill()
+                        except OSError:
+                            pass
+                    # Then cancel the job - use the safe_cancel method here
+                    await self.safe_cancel_job(subjob)
+                else:
+                    cancel_task.cancel()
+                    read_task.result()
         except OSError as e:
             LOGGER.error("Error opening output file for %s: %s", subjob, str(e))
         finally:
-            if process and process.poll() is None:
+            if process and process.returncode is None:
                 try:
                     process.kill()  # Use kill instead of terminate for immediate effect
                 except OSError:
                     pass
-
-            # No need to cancel job here again - it's already handled in check_cancellation
-            # Only cancel if the cancellation wasn't handled by check_cancellation
-            if cancellation_token.is_cancelled() and subjob not in self.cancelled_jobs:
-                self.safe_cancel_job(subjob)
+                await process.wait()
 
         LOGGER.debug("Capturing %s output finished", subjob)
         LOGGER.debug("Results are %s", ret_val)
-        result_queue.put(ret_val)
         return ret_val
 
-    def monitor_subjobs(
-        self, subjobs, result_queue, output_directory, completion_threshold
-    ):
+    async def monitor_subjobs(self, subjobs, output_directory, completion_threshold):
         """
         Monitor multiple subjobs concurrently.
 
         Args:
             subjobs (list): List of job IDs to monitor
-            result_queue (Queue): Queue to collect results
             output_directory (str): Directory to write output files to
             completion_threshold (int): Number of successful completions required
 
         Returns:
-            int: Number of successfully completed jobs
+            tuple: Number of successfully completed jobs and list of result
+                dictionaries of all monitored subjobs
         """
         LOGGER.info(
             "Monitoring %d subjobs, need %d successful completions",
@@ -493,35 +698,31 @@ class TestflingerSubmitter:
             completion_threshold,
         )
 
-        cancellation_tokens = {subjob: CancellableThread() for subjob in subjobs}
-        future_to_subjob = {}
-
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=len(subjobs)
-        ) as executor:
-            # Submit all monitoring tasks
-            for subjob in subjobs:
-                future = executor.submit(
-                    self.monitor_subjob,
+        cancellation_events = {subjob: asyncio.Event() for subjob in subjobs}
+        task_to_subjob = {
+            asyncio.create_task(
+                self.monitor_subjob(
                     subjob,
-                    result_queue,
                     output_directory,
-                    cancellation_tokens[subjob],
+                    cancellation_events[subjob],
                 )
-                future_to_subjob[future] = subjob
+            ): subjob
+            for subjob in subjobs
+        }
 
-            completed_count = 0
-            completed_futures = []
+        completed_count = 0
+        pending = set(task_to_subjob)
 
-            # Process as they complete
-            for future in concurrent.futures.as_completed(
-                list(future_to_subjob.keys())
-            ):
-                subjob = future_to_subjob[future]
+        # Process as they complete
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                subjob = task_to_subjob[task]
 
                 try:
-                    result = future.result()
-                    completed_futures.append(future)
+                    result = task.result()
 
                     if result["ip"]:
                         LOGGER.info(
@@ -532,29 +733,30 @@ class TestflingerSubmitter:
                         completed_count += 1
                     else:
                         LOGGER.warning("Job %s did not produce an IP address", subjob)
-
-                    # Check if we've reached our threshold
-                    if completed_count >= completion_threshold:
-                        LOGGER.info(
-                            "Reached target of %d successful completions!",
-                            completion_threshold,
-                        )
-                        # Cancel all remaining jobs
-                        for remaining_subjob, token in cancellation_tokens.items():
-                            if remaining_subjob != subjob and not token.is_cancelled():
-                                LOGGER.info(
-                                    "Sending cancellation signal to subjob %s",
-                                    remaining_subjob,
-                                )
-                                token.cancel()
-                        break
                 except Exception as e:
                     LOGGER.error("Error monitoring subjob %s: %s", subjob, str(e))
 
-            # Wait a short time for cancellations to take effect before shutting down
-            time.sleep(2)
+            # Check if we've reached our threshold
+            if completed_count >= completion_threshold:
+                LOGGER.info(
+                    "Reached target of %d successful completions!",
+                    completion_threshold,
+                )
+                # Cancel all remaining jobs
+                for task in pending:
+                    remaining_subjob = task_to_subjob[task]
+                    LOGGER.info(
+                        "Sending cancellation signal to subjob %s", remaining_subjob
+                    )
+                    cancellation_events[remaining_subjob].set()
+                break
+
+        # Wait for cancelled subjobs to kill their processes and cancel their jobs
+        if pending:
+            await asyncio.wait(pending)
 
-        return completed_count
+        results = [task.result() for task in task_to_subjob if not task.exception()]
+        return completed_count, results
 
     def read_servers_file(self):
         """
@@ -577,69 +779,84 @@ class TestflingerSubmitter:
 
     def create_cancel_script(self):
         """Create a shell script to cancel all jobs if needed."""
+        header = "#!/bin/bash\n\n# Auto-generated script to cancel testflinger jobs\n\n"
+        commands = "".join(
+            f"testflinger-cli cancel {job_id}\n" for job_id in self.job_ids
+        )
         try:
-            with open("cancel.sh", "w") as f:
-                f.write("#!/bin/bash\n\n")
-                f.write("# Auto-generated script to cancel testflinger jobs\n\n")
-                for job_id in self.job_ids:
-                    f.write(f"testflinger-cli cancel {job_id}\n")
+            Path("cancel.sh").write_text(header + commands)
             os.chmod("cancel.sh", 0o755)
             LOGGER.info("Created cancel.sh script")
         except OSError as e:
             LOGGER.warning("Could not create cancel script: %s", str(e))
 
-    def submit_jobs(self):
+    async def submit_jobs(self):
         """
         Submit generated YAML files as testflinger jobs.
 
+        All files are submitted concurrently.
+
         Returns:
             list: List of job IDs
         """
-        job_ids = []
-        for file in self.get_yaml_files():
+
+        async def submit(file):
             LOGGER.debug("Submitting job for %s", file)
             try:
-                output = self.call_testflinger(["submit", file])
-                job_id = re.sub(".*\n.*job_id: ", "", output).strip()
-                LOGGER.info("Submitted job %s", job_id)
-                job_ids.append(job_id)
-            except (TestflingerError, re.error) as e:
+                output = await self.call_testflinger(["submit", file])
+            except TestflingerError as e:
                 LOGGER.error("Failed to submit job for %s: %s", file, str(e))
+                return None
+
+            match = JOB_ID_RE.search(output)
+            if not match:
+                LOGGER.error("No job ID in submit output for %s: %s", file, output)
+                return None
+
+            job_id = match.group(1)
+            LOGGER.info("Submitted job %s", job_id)
+            return job_id
+
+        submitted = await asyncio.gather(*map(submit, self.get_yaml_files()))
+        job_ids = [job_id for job_id in submitted if job_id]
 
         self.job_ids = job_ids
         return job_ids
 
-    def verify_results(self, results):
+    async def verify_results(self, results):
         """
         Verify the results and cancel any failed jobs.
 
+        Status queries for all jobs are issued concurrently.
+
         Args:
             results (list): List of result dictionaries
 
         Returns:
             list: List of valid results
         """
-        valid_results = []
-        for result in results:
+
+        async def verify(result):
             try:
-                if not result["job_id"]:
-                    continue
-
-                output = self.call_testflinger(["status", result["job_id"]])
-                if "reserve" not in output:
-                    LOGGER.debug(
-                        "%s with %s failed ",
-                        result.get("name", "Unknown"),
-                        result["job_id"],
-                    )
-                    # Use safe_cancel instead of direct call
-                    self.safe_cancel_job(result["job_id"])
-                else:
-                    valid_results.append(result)
+                output = await self.call_testflinger(["status", result["job_id"]])
             except TestflingerError as e:
                 LOGGER.warning("Error verifying job %s: %s", result["job_id"], str(e))
+                return False
+
+            if "reserve" not in output:
+                LOGGER.debug(
+                    "%s with %s failed ",
+                    result.get("name", "Unknown"),
+                    result["job_id"],
+                )
+                # Use safe_cancel instead of direct call
+                await self.safe_cancel_job(result["job_id"])
+                return False
+            return True
 
-        return valid_results
+        results = [result for result in results if result["job_id"]]
+        verified = await asyncio.gather(*map(verify, results))
+        return [result for result, valid in zip(results, verified) if valid]
 
     def run(self):
         """
@@ -648,6 +865,17 @@ class TestflingerSubmitter:
         Returns:
             int: 0 for success, 1 for failure
         """
+        return asyncio.run(self._run())
+
+    async def _run(self):
+        """Coroutine behind run, see there for the return value."""
+        if self.server:
+            # REST calls and output polls run in worker threads, size the pool
+            # for the calls in flight instead of the CPU count based default
+            asyncio.get_running_loop().set_default_executor(
+                concurrent.futures.ThreadPoolExecutor(max_workers=MAX_PARALLEL_CALLS)
+            )
+
         try:
             # Read server list and get available agents
             servers = self.read_servers_file()
@@ -667,7 +895,7 @@ class TestflingerSubmitter:
             self.generate_yaml_files(agents)
 
             # Submit jobs
-            self.job_ids = self.submit_jobs()
+            self.job_ids = await self.submit_jobs()
             if not self.job_ids:
                 LOGGER.error("No jobs were submitted successfully")
                 return 1
@@ -675,8 +903,8 @@ class TestflingerSubmitter:
             self.create_cancel_script()
 
             # Monitor jobs
-            completion_count = self.monitor_subjobs(
-                self.job_ids, self.result_queue, OUTPUT_DIR, self.completion_threshold
+            completion_count, results = await self.monitor_subjobs(
+                self.job_ids, OUTPUT_DIR, self.completion_threshold
             )
 
             if completion_count < self.completion_threshold:
@@ -685,23 +913,20 @@ class TestflingerSubmitter:
                     completion_count,
                     self.completion_threshold,
                 )
-                for job_id in self.job_ids:
-                    if job_id not in self.cancelled_jobs:
+                await asyncio.gather(
+                    *(
                         self.safe_cancel_job(job_id)
+                        for job_id in self.job_ids
+                        if job_id not in self.cancelled_jobs
+                    )
+                )
                 return 1
 
-            # Collect and verify results
-            results = []
-            try:
-                while not self.result_queue.empty():
-                    results.append(self.result_queue.get(block=False))
-            except Empty:
-                pass
-
-            valid_results = self.verify_results(results)
+            # Verify results
+            valid_results = await self.verify_results(results)
 
             # Output results
-            print(yaml.dump(valid_results, sort_keys=False))
+            print(yaml.dump(valid_results, sort_keys=False, Dumper=YamlDumper))
             ip_addresses = [result["ip"] for result in valid_results if result["ip"]]
             print(" ".join(ip_addresses))
             return 0